@@ -19,6 +19,10 @@ from dashboard.internet_nl_dashboard.scanners.scan_internet_nl_per_account impor
 
 log = logging.getLogger(__package__)
 
+# All scans of a list are prefetched to get the last one, only the fields shown are retrieved. The related scan
+# is not needed: the id of that scan is already in the scan_id column. urllist_id is used to match the prefetch.
+LAST_SCAN_FIELDS = ['id', 'urllist_id', 'scan_id', 'state', 'started_on', 'finished_on']
+
 
 # todo: write test
 def alter_url_in_urllist(account, data) -> Dict[str, Any]:
@@ -221,8 +225,7 @@ def get_scan_status_of_list(account: Account, list_id: int) -> Dict[str, Any]:
 
     prefetch_last_scan = Prefetch(
         'accountinternetnlscan_set',
-        queryset=AccountInternetNLScan.objects.order_by('-id').select_related('scan').only('scan_id',
-                                                                                           'finished_on'),
+        queryset=AccountInternetNLScan.objects.order_by('-id').only(*LAST_SCAN_FIELDS),
         to_attr='last_scan'
     )
 
@@ -246,7 +249,7 @@ def get_scan_status_of_list(account: Account, list_id: int) -> Dict[str, Any]:
             'last_report_date': None, 'scan_now_available': urllist.is_scan_now_available()}
 
     if len(urllist.last_scan):
-        data['last_scan_id'] = urllist.last_scan[0].scan.id
+        data['last_scan_id'] = urllist.last_scan[0].scan_id
         data['last_scan_state'] = urllist.last_scan[0].state
         data['last_scan_finished'] = urllist.last_scan[0].state in ["finished", "cancelled"]
 
@@ -311,7 +314,7 @@ def update_list_settings(account: Account, user_input: Dict) -> Dict[str, Any]:
 
     prefetch_last_scan = Prefetch(
         'accountinternetnlscan_set',
-        queryset=AccountInternetNLScan.objects.order_by('-id').select_related('scan'),
+        queryset=AccountInternetNLScan.objects.order_by('-id').only(*LAST_SCAN_FIELDS),
         to_attr='last_scan'
     )
 
@@ -353,7 +356,7 @@ def update_list_settings(account: Account, user_input: Dict) -> Dict[str, Any]:
     data['num_urls'] = urllist.num_urls
 
     # inject the last scan information.
-    data['last_scan_id'] = None if not len(urllist.last_scan) else urllist.last_scan[0].scan.id
+    data['last_scan_id'] = None if not len(urllist.last_scan) else urllist.last_scan[0].scan_id
     data['last_scan_state'] = None if not len(urllist.last_scan) else urllist.last_scan[0].state
 
     data['last_scan'] = None if not len(urllist.last_scan) else urllist.last_scan[0].started_on.isoformat()
@@ -431,7 +434,7 @@ def get_urllists_from_account(account: Account) -> Dict:
     # this prefetch is pretty fast.
     last_scan_prefetch = Prefetch(
         'accountinternetnlscan_set',
-        queryset=AccountInternetNLScan.objects.order_by('-id').select_related('scan'),
+        queryset=AccountInternetNLScan.objects.order_by('-id').only(*LAST_SCAN_FIELDS),
         to_attr='last_scan'
     )
 
@@ -469,12 +472,14 @@ def get_urllists_from_account(account: Account) -> Dict:
             'scan_type': urllist.scan_type,
             'automated_scan_frequency': urllist.automated_scan_frequency,
             'scheduled_next_scan': urllist.scheduled_next_scan,
-            'last_scan_id': None if not len(urllist.last_scan) else urllist.last_scan[0].scan.id,
+            'last_scan_id': None if not len(urllist.last_scan) else urllist.last_scan[0].scan_id,
             'last_scan_state': None if not len(urllist.last_scan) else urllist.last_scan[0].state,
             'last_scan': None if not len(urllist.last_scan) else urllist.last_scan[0].started_on.isoformat(),
             'last_scan_finished': None if not len(urllist.last_scan) else urllist.last_scan[0] in [
                 "finished", "cancelled"],
-            'scan_now_available': urllist.is_scan_now_available(),
+            # derived from the prefetched scans, which saves a query per list.
+            'scan_now_available': urllist.is_scan_now_available_after(
+                None if not len(urllist.last_scan) else urllist.last_scan[0]),
             'last_report_id': None if not len(urllist.last_report) else urllist.last_report[0].id,
             'last_report_date': None if not len(urllist.last_report) else urllist.last_report[0].at_when,
             'list_warnings': list_warnings
@@ -1,111 +1,171 @@
 from datetime import timedelta
-from typing import List
+from typing import Dict, List
 
 from constance import config
+from django.core.cache import cache
+from django.db.models import Count, Max
 from django.utils import timezone
 
 from dashboard.internet_nl_dashboard.models import (Account, AccountInternetNLScan,
                                                     AccountInternetNLScanLog, UrlListReport)
 
+# Reports are created within a day after the scan has finished.
+_ONE_DAY = timedelta(hours=24)
+
+# The dashboard polls the scan monitor every few seconds, while the scans only change every now and then.
+SCAN_MONITOR_CACHE_TIMEOUT = 15
+
+# Scans that have been retried a lot can have thousands of log messages, only the latest ones are relevant.
+MAX_LOGS_PER_SCAN = 100
+
+
+def get_fallback_reports(scans: List[Dict]) -> Dict[int, List]:
+    """
+    Retrieves the reports for finished scans that have no report attached, in a single query. This was needed before
+    the connection between report and scan was solidified. The result is a list of (at_when, id) per urllist_id,
+    ordered by id descending, so the first match in the list is the newest report.
+
+    :param scans: AccountInternetNLScan values
+    :return: {urllist_id: [(at_when, id), ...]}
+    """
+    fallback = [(scan['urllist_id'], scan['finished_on']) for scan in scans
+                if scan['state_code'] == AccountInternetNLScan.State.FINISHED and scan['report_id'] is None
+                and scan['finished_on']]
+
+    if not fallback:
+        return {}
+
+    reports = UrlListReport.objects.all().filter(
+        urllist_id__in={urllist_id for urllist_id, _ in fallback},
+        at_when__gte=min(finished_on for _, finished_on in fallback),
+        at_when__lte=max(finished_on for _, finished_on in fallback) + _ONE_DAY
+    ).order_by('-id').values_list('urllist_id', 'at_when', 'id')
+
+    bucketed_reports: Dict[int, List] = {}
+    for urllist_id, at_when, report_id in reports:
+        bucketed_reports.setdefault(urllist_id, []).append((at_when, report_id))
+
+    return bucketed_reports
+
+
+def get_scan_logs(scans: List[Dict]) -> Dict[int, List]:
+    """
+    Retrieves the logs of all given scans in a single query, newest log first. At most MAX_LOGS_PER_SCAN logs are
+    returned per scan. This limit is applied while reading the rows: the database still sends all logs of these scans.
+    Only the returned logs are converted to response dicts. Some drivers, such as the MySQL ones, load the whole
+    result set into memory even when streaming with iterator().
+
+    :param scans: AccountInternetNLScan values
+    :return: {scan_id: [{'at_when': ..., 'state': ...}, ...]}
+    """
+    logs = AccountInternetNLScanLog.objects.all().filter(
+        scan_id__in=[scan['id'] for scan in scans]
+    ).order_by('-at_when').values('scan_id', 'at_when', 'state')
+
+    bucketed_logs: Dict[int, List] = {}
+    for log in logs.iterator(chunk_size=500):
+        scan_logs = bucketed_logs.setdefault(log['scan_id'], [])
+        if len(scan_logs) < MAX_LOGS_PER_SCAN:
+            scan_logs.append({'at_when': log['at_when'], 'state': log['state']})
+
+    return bucketed_logs
+
 
 def get_scan_monitor_data(account: Account) -> List:
+    """
+    Returns the scan monitor data from a short lived cache. The cache key changes when a scan is added, a list is
+    deleted, the state of a scan changed or a new report is attached to a scan. The runtime of running scans and the
+    last_check moment of internet.nl scans are not part of the key: these may be SCAN_MONITOR_CACHE_TIMEOUT seconds
+    stale.
 
-    # at least .defer('report__calculation'), as that takes a lot of time to load in(!)
-    scans = AccountInternetNLScan.objects.all().filter(
+    :param account:
+    :return:
+    """
+    latest = AccountInternetNLScan.objects.all().filter(
         account=account,
         urllist__is_deleted=False
-    ).order_by('-pk')[0:30].select_related(
-        'urllist', 'scan', 'report'
-    ).defer('report__calculation')
+    ).aggregate(max_id=Max('id'), count=Count('id'), last_change=Max('state_changed_on'),
+                max_report_id=Max('report_id'))
 
-    """
-    using defer is about as fast, and better to program with
+    last_change = latest['last_change'].timestamp() if latest['last_change'] else 0
+    cache_key = f"scan_monitor:{account.id}:{latest['max_id']}:{latest['count']}:{last_change}:" \
+                f"{latest['max_report_id']}"
 
-    .only('state', 'id', 'report__id', 'scan__finished_on', 'scan__started_on', 'scan__type', 'scan__finished',
-       'scan__status_url', 'scan__friendly_message', 'scan__success', 'urllist__name', 'urllist_id',
-       'scan__last_check', )
-    """
+    response = cache.get(cache_key)
+    if response is None:
+        response = create_scan_monitor_data(account)
+        cache.set(cache_key, response, timeout=SCAN_MONITOR_CACHE_TIMEOUT)
+
+    return response
+
+
+def create_scan_monitor_data(account: Account) -> List:
+
+    # Only plain values are retrieved: no model methods are used and this saves instantiating a lot of models. This
+    # also means the large report__calculation field is never loaded. Logs and reports are retrieved in bulk below.
+    scans_qs = AccountInternetNLScan.objects.all().filter(
+        account=account,
+        urllist__is_deleted=False
+    ).order_by('-pk')[0:30].values(
+        'id', 'scan_id', 'state', 'state_code', 'started_on', 'finished_on', 'report_id', 'urllist__name',
+        'urllist_id', 'urllist__scan_type', 'scan__scan_id', 'scan__type', 'scan__last_state_check'
+    )
+    # Run the query once: the bulk lookups below and the loop all use the same rows.
+    scans = list(scans_qs)
 
     # prevent a bunch of query-per-access:
-    internet_nl_api_url = config.INTERNET_NL_API_URL
+    status_url_prefix = f"{config.INTERNET_NL_API_URL}/requests/"
+    fallback_reports = get_fallback_reports(scans)
+    scan_logs = get_scan_logs(scans)
+    now = timezone.now()
 
     response = []
     for scan in scans:
-        # nested query, should be optimized, prefetch doesn't work here as it's one line down... for 30 queries
-        # it's probably fine but far from ideal.
+        # The response is a dict literal on purpose: with constant keys it is built in one go, which is faster than
+        # alternatives such as dict(zip(keys, values)). Values that are used more than once are looked up once.
+        state = scan['state']
+        started_on = scan['started_on']
+        finished_on = scan['finished_on']
 
-        last_report_id = None
         # Finished means also report created, mail sent, etc.
-        if scan.state == "finished":
-            # first report within the next day
-            if scan.report:
-                last_report_id = scan.report.id
-            else:
-                # heuristic approach, this approach was used before the connection between report and scan
-                # was solidified (and became reliable). This code is here to be backwards compatible with
-                # existing reports.
-                last_report = UrlListReport.objects.all().filter(
-                    urllist=scan.urllist,
-                    at_when__lte=scan.finished_on + timedelta(hours=24),
-                    at_when__gte=scan.finished_on
-                ).order_by('-id').only('id').first()
-
-                if last_report:
-                    last_report_id = last_report.id
-
-        if scan.state == "finished":
-            runtime = scan.finished_on - scan.started_on
-        else:
-            runtime = timezone.now() - scan.started_on
-
-        # get complete log from this scan.
-        logs = AccountInternetNLScanLog.objects.all().filter(scan=scan).order_by('-at_when')
-        log_messages = []
-        for log in logs:
-            log_messages.append({'at_when': log.at_when, 'state': log.state})
-
-        runtime = runtime.total_seconds() * 1000
-
-        if not scan.scan:
-            response.append({
-                'id': scan.id,
-                # mask that there is a mail_dashboard variant.
-                'type': "web" if scan.urllist.scan_type == "web" else "mail",
-                'started': True,
-                'started_on': scan.started_on,
-                'finished': scan.finished,
-                'finished_on': scan.finished_on,
-                'status_url': f"{internet_nl_api_url}/requests/{scan.scan.scan_id}",
-                'message': scan.state,
-                'success': scan.finished,
-                'list': scan.urllist.name,
-                'list_id': scan.urllist.id,
-                'last_check': scan.scan.last_state_check,
-                'runtime': runtime,
-                'last_report_id': last_report_id,
-                'state': scan.state,
-                'log': log_messages
-            })
-
-        else:
-            response.append({
-                'id': scan.id,
-                # mask that there is a mail_dashboard variant.
-                'type': "web" if scan.scan.type == "web" else "mail",
-                'started': True,
-                'started_on': scan.started_on,
-                'finished': scan.finished,
-                'finished_on': scan.finished_on,
-                'status_url': f"{internet_nl_api_url}/requests/{scan.scan.scan_id}",
-                'message': scan.state,
-                'success': scan.finished,
-                'list': scan.urllist.name,
-                'list_id': scan.urllist.id,
-                'last_check': scan.scan.last_state_check,
-                'runtime': runtime,
-                'last_report_id': last_report_id,
-                'state': scan.state,
-                'log': log_messages
-            })
+        finished = scan['state_code'] == AccountInternetNLScan.State.FINISHED
+
+        # first report within the next day. The report is attached before the scan is finished, for example while
+        # sending mail, but it is only shown when the scan is finished.
+        last_report_id = scan['report_id'] if finished else None
+        if finished and not last_report_id:
+            # heuristic approach, this approach was used before the connection between report and scan
+            # was solidified (and became reliable). This code is here to be backwards compatible with
+            # existing reports.
+            for at_when, report_id in fallback_reports.get(scan['urllist_id'], []):
+                if finished_on <= at_when <= finished_on + _ONE_DAY:
+                    last_report_id = report_id
+                    break
+
+        runtime = (finished_on if finished else now) - started_on
+
+        # scans that are not yet registered at internet.nl have no scan object yet, so all scan__ values are None.
+        scan_type = scan['scan__type'] if scan['scan_id'] is not None else scan['urllist__scan_type']
+        scan_id = scan['scan__scan_id']
+
+        response.append({
+            'id': scan['id'],
+            # mask that there is a mail_dashboard variant.
+            'type': "web" if scan_type == "web" else "mail",
+            'started': True,
+            'started_on': started_on,
+            'finished': finished,
+            'finished_on': finished_on,
+            'status_url': status_url_prefix + scan_id if scan_id else None,
+            'message': state,
+            'success': finished,
+            'list': scan['urllist__name'],
+            'list_id': scan['urllist_id'],
+            'last_check': scan['scan__last_state_check'],
+            'runtime': runtime.total_seconds() * 1000,
+            'last_report_id': last_report_id,
+            'state': state,
+            'log': scan_logs.get(scan['id'], [])
+        })
 
     return response
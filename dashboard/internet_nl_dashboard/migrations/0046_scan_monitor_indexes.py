@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet_nl_dashboard', '0045_auto_20201027_1039'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accountinternetnlscan',
+            index=models.Index(fields=['account', '-id'], name='accountscan_account_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accountinternetnlscan',
+            index=models.Index(fields=['urllist', '-id'], name='accountscan_urllist_id_idx'),
+        ),
+    ]
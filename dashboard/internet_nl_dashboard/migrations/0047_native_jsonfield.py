@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet_nl_dashboard', '0046_scan_monitor_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='report_settings',
+            field=models.JSONField(
+                blank=True, help_text='This stores reporting preferences: what fields are shown in the UI and so on (if any other).This field can be edited on the report page.', null=True),
+        ),
+    ]
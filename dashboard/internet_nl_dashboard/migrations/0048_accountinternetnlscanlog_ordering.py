@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet_nl_dashboard', '0047_native_jsonfield'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='accountinternetnlscanlog',
+            options={'ordering': ['-at_when']},
+        ),
+        migrations.AddIndex(
+            model_name='accountinternetnlscanlog',
+            index=models.Index(fields=['scan', '-at_when'], name='scanlog_scan_at_when_idx'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet_nl_dashboard', '0048_accountinternetnlscanlog_ordering'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='urllistreport',
+            index=models.Index(fields=['urllist', 'at_when'], name='urllistreport_list_when_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+def backfill_state_code(apps, schema_editor):
+    # The same derivation as AccountInternetNLScan.State.from_state, everything else stays running (0).
+    AccountInternetNLScan = apps.get_model('internet_nl_dashboard', 'AccountInternetNLScan')
+    AccountInternetNLScan.objects.filter(state='finished').update(state_code=1)
+    AccountInternetNLScan.objects.filter(state__startswith='cancelled').update(state_code=2)
+    AccountInternetNLScan.objects.filter(state__startswith='error').update(state_code=3)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('internet_nl_dashboard', '0049_urllistreport_urllist_at_when_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accountinternetnlscan',
+            name='state_code',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'running'), (1, 'finished'), (2, 'cancelled'), (3, 'error')], db_index=True, default=0,
+                                                   help_text='The lifecycle of the scan, derived from the state when saving. Use this for filtering.'),
+        ),
+        migrations.RunPython(backfill_state_code, migrations.RunPython.noop),
+    ]
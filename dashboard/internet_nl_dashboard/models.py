@@ -1,15 +1,19 @@
 import logging
 from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from typing import Optional
 
-import pytz
 import requests
 from cryptography.fernet import Fernet
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django_countries.fields import CountryField
-from jsonfield import JSONField
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from websecmap.organizations.models import Url
 from websecmap.reporting.models import SeriesOfUrlsReportMixin
@@ -19,6 +23,20 @@ log = logging.getLogger(__package__)
 
 CREDENTIAL_CHECK_URL = "https://batch.internet.nl/api/"
 
+# Credential checks reuse connections to the API, which saves a TCP and TLS handshake per check.
+CREDENTIAL_CHECK_SESSION = requests.Session()
+CREDENTIAL_CHECK_SESSION.mount('https://', HTTPAdapter(pool_maxsize=16))
+
+# Placeholder for lists that have not been scheduled yet, renew_scan_moment sets the actual moment.
+FAR_FUTURE = datetime(2030, 1, 1, 1, 1, 1, 601526, tzinfo=dt_timezone.utc)
+
+
+@lru_cache(maxsize=1)
+def get_fernet() -> Fernet:
+    # Parsing the key and setting up Fernet is done once, instead of at every en/decryption. This is not done at
+    # import time, to not require settings when importing this module.
+    return Fernet(settings.FIELD_ENCRYPTION_KEY)
+
 
 class Account(models.Model):
     """
@@ -58,7 +76,7 @@ class Account(models.Model):
         default=False
     )
 
-    report_settings = JSONField(
+    report_settings = models.JSONField(
         help_text="This stores reporting preferences: what fields are shown in the UI and so on (if any other)."
                   "This field can be edited on the report page.",
         null=True,
@@ -71,14 +89,14 @@ class Account(models.Model):
     """
     @staticmethod
     def encrypt_password(password):
-        f = Fernet(settings.FIELD_ENCRYPTION_KEY)
-        return str(f.encrypt(password.encode()))
+        # Fernet tokens are url safe base64, so they can be stored as a plain string.
+        return get_fernet().encrypt(password.encode()).decode('utf-8')
 
     @staticmethod
     def connect_to_internet_nl_api(username: str, password: str):
         # This makes a connection to the internet.nl dashboard using .htaccess authentication.
         try:
-            response = requests.get(
+            response = CREDENTIAL_CHECK_SESSION.get(
                 CREDENTIAL_CHECK_URL,
                 auth=HTTPBasicAuth(username, password),
                 # a massive timeout for a large file.
@@ -98,10 +116,12 @@ class Account(models.Model):
         if not self.internet_nl_api_password:
             raise ValueError('Password was not set.')
 
-        f = Fernet(settings.FIELD_ENCRYPTION_KEY)
-        # Convert the string back to bytes again is not beautiful. But it's a bit more reliable than
-        # storing the encrypted password in 'bytes', which somewhere goes wrong.
-        return f.decrypt(bytes(self.internet_nl_api_password[2:-1], encoding='UTF-8')).decode('utf-8')
+        token = self.internet_nl_api_password
+        # Passwords used to be stored as the string representation of bytes: "b'...'". A token never contains quotes.
+        if token.startswith("b'") and token.endswith("'"):
+            token = token[2:-1]
+
+        return get_fernet().decrypt(token.encode('utf-8')).decode('utf-8')
 
     def __str__(self):
         return "%s" % self.name
@@ -154,6 +174,54 @@ class DashboardUser(models.Model):
         return "%s/%s" % (self.account, self.user)
 
 
+def _utc_midnight(year: int, month: int, day: int = 1) -> datetime:
+    return datetime(year=year, month=month, day=day, hour=0, minute=0, second=0, tzinfo=dt_timezone.utc)
+
+
+def _next_scan_disabled(now: datetime) -> datetime:
+    # far, far in the future, so it will not be scanned and probably will be re-calculated. 24 years...
+    return now + timedelta(days=9000)
+
+
+def _next_scan_every_half_year(now: datetime) -> datetime:
+    # months are base 1: january = 1 etc.
+    if now.month <= 6:
+        return _utc_midnight(now.year, 7)
+    return _utc_midnight(now.year + 1, 1)
+
+
+def _next_scan_every_quarter(now: datetime) -> datetime:
+    if now.month >= 10:
+        return _utc_midnight(now.year + 1, 1)
+    # 1-3 -> 4, 4-6 -> 7, 7-9 -> 10
+    return _utc_midnight(now.year, (now.month - 1) // 3 * 3 + 4)
+
+
+def _next_scan_every_month(now: datetime) -> datetime:
+    if now.month == 12:
+        return _utc_midnight(now.year + 1, 1)
+    return _utc_midnight(now.year, now.month + 1)
+
+
+def _next_scan_twice_per_month(now: datetime) -> datetime:
+    # since the 14'th day never causes a month or year rollover, we can simply schedule for the 15th day.
+    if now.day <= 14:
+        return _utc_midnight(now.year, now.month, 15)
+
+    # otherwise exactly the same as the 1st day of every month
+    return _next_scan_every_month(now)
+
+
+# Translates the automated_scan_frequency of an UrlList to the next moment a scan should be started.
+NEXT_SCAN_MOMENT_HANDLERS = {
+    'disabled': _next_scan_disabled,
+    'every half year': _next_scan_every_half_year,
+    'at the start of every quarter': _next_scan_every_quarter,
+    'every 1st day of the month': _next_scan_every_month,
+    'twice per month': _next_scan_twice_per_month,
+}
+
+
 class UrlList(models.Model):
     """
     This is a list of urls that will be scanned on internet.nl.
@@ -207,7 +275,7 @@ class UrlList(models.Model):
     scheduled_next_scan = models.DateTimeField(
         help_text="An indication at what moment the scan will be started. The scan can take a while, thus this does "
                   "not tell you when a scan will be finished. All dates in the past will be scanned and updated.",
-        default=datetime(2030, 1, 1, 1, 1, 1, 601526, tzinfo=pytz.utc)
+        default=FAR_FUTURE
     )
 
     is_deleted = models.BooleanField(
@@ -253,46 +321,10 @@ class UrlList(models.Model):
         :param preference:
         :return:
         """
-        now = timezone.now()
-
-        if preference == 'disabled':
-            # far, far in the future, so it will not be scanned and probably will be re-calculated. 24 years...
-            return now + timedelta(days=9000)
-
-        # months are base 1: january = 1 etc.
-        if preference == 'every half year':
-            if now.month in [1, 2, 3, 4, 5, 6]:
-                return datetime(year=now.year, month=7, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-            return datetime(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-
-        if preference == 'at the start of every quarter':
-
-            if now.month in [1, 2, 3]:
-                return datetime(year=now.year, month=4, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-            if now.month in [4, 5, 6]:
-                return datetime(year=now.year, month=7, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-            if now.month in [7, 8, 9]:
-                return datetime(year=now.year, month=10, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-            if now.month in [10, 11, 12]:
-                return datetime(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-
-        if preference == 'every 1st day of the month':
-            if now.month == 12:
-                return datetime(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-            return datetime(year=now.year, month=now.month + 1, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-
-        if preference == 'twice per month':
-            # since the 14'th day never causes a month or year rollover, we can simply schedule for the 15th day.
-            # note: range is not used because range is _to_ a certain moment.
-            if now.day in [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14]:
-                return datetime(year=now.year, month=now.month, day=15, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-
-            # otherwise exactly the same as the 1st day of every month
-            if now.month == 12:
-                return datetime(year=now.year + 1, month=1, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-            return datetime(year=now.year, month=now.month + 1, day=1, hour=0, minute=0, second=0, tzinfo=pytz.utc)
-
-        raise ValueError('String %s could not be translated to a scan moment.' % preference)
+        if preference not in NEXT_SCAN_MOMENT_HANDLERS:
+            raise ValueError('String %s could not be translated to a scan moment.' % preference)
+
+        return NEXT_SCAN_MOMENT_HANDLERS[preference](timezone.now())
 
     # @pysnooper.snoop()
     def is_scan_now_available(self) -> bool:
@@ -307,10 +339,6 @@ class UrlList(models.Model):
         :return:
         """
 
-        if not self.enable_scans:
-            # log.debug("Scan now NOT available: List %s has disabled scans." % self)
-            return False
-
         # Deprecated: At least N hours should have passed since the last manual scan.
         # yesterday = timezone.now() - timedelta(hours=1)
         # manual scans have their own 'is available flag', as the 'create_dashboard_scan_tasks()' does not guarantee
@@ -320,7 +348,25 @@ class UrlList(models.Model):
         #   return False
         # End deprecation
 
-        last_scan = AccountInternetNLScan.objects.all().filter(urllist=self, urllist__is_deleted=False).last()
+        # the last scan does not matter when scans are disabled, which saves a query.
+        last_scan = None
+        if self.enable_scans:
+            last_scan = AccountInternetNLScan.objects.all().filter(urllist=self, urllist__is_deleted=False).last()
+
+        return self.is_scan_now_available_after(last_scan)
+
+    def is_scan_now_available_after(self, last_scan: Optional['AccountInternetNLScan']) -> bool:
+        """
+        The rules of is_scan_now_available, for when the last scan of this list is already known. For example when
+        the scans of many lists are prefetched, which saves a query per list.
+
+        :param last_scan: the last AccountInternetNLScan of this list, None if this list was never scanned.
+        :return:
+        """
+
+        if not self.enable_scans:
+            # log.debug("Scan now NOT available: List %s has disabled scans." % self)
+            return False
 
         if not last_scan:
             # log.debug("Scan now available: a previous scan was never performed on list %s" % self)
@@ -426,6 +472,10 @@ class UrlListReport(SeriesOfUrlsReportMixin):
         index_together = [
             ["at_when", "id"],
         ]
+        indexes = [
+            # Reports of a list are looked up in a time window, for example to find the report of a scan.
+            models.Index(fields=['urllist', 'at_when'], name='urllistreport_list_when_idx'),
+        ]
 
     def get_previous_report_from_this_list(self):
         """
@@ -449,6 +499,26 @@ class AccountInternetNLScan(models.Model):
     created the UrlList serves as extra data.
     """
 
+    class State(models.IntegerChoices):
+        """
+        The coarse lifecycle of a scan, derived from the detailed state. Comparing and filtering on this number is
+        cheaper than on the state strings, of which there are many variants.
+        """
+        RUNNING = 0, 'running'
+        FINISHED = 1, 'finished'
+        CANCELLED = 2, 'cancelled'
+        ERROR = 3, 'error'
+
+        @classmethod
+        def from_state(cls, state: str) -> int:
+            if state == "finished":
+                return cls.FINISHED
+            if state.startswith("cancelled"):
+                return cls.CANCELLED
+            if state.startswith("error"):
+                return cls.ERROR
+            return cls.RUNNING
+
     account = models.ForeignKey(
         Account,
         on_delete=models.CASCADE,
@@ -475,6 +545,13 @@ class AccountInternetNLScan(models.Model):
         help_text="The current state"
     )
 
+    state_code = models.PositiveSmallIntegerField(
+        choices=State.choices,
+        default=State.RUNNING,
+        db_index=True,
+        help_text="The lifecycle of the scan, derived from the state when saving. Use this for filtering."
+    )
+
     started_on = models.DateTimeField(
         blank=True,
         null=True
@@ -499,11 +576,32 @@ class AccountInternetNLScan(models.Model):
                   "is needed to figure out what report belongs to what scan."
     )
 
+    class Meta:
+        indexes = [
+            # The scan monitor and list overview retrieve the latest scans per account and per list.
+            models.Index(fields=['account', '-id'], name='accountscan_account_id_idx'),
+            models.Index(fields=['urllist', '-id'], name='accountscan_urllist_id_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # state_code is derived in set_state_code, make sure it is stored together with the state.
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'state' in update_fields and 'state_code' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['state_code']
+
+        super().save(*args, **kwargs)
+
     @property
     def finished(self):
         return self.state == "finished"
 
 
+@receiver(pre_save, sender=AccountInternetNLScan)
+def set_state_code(sender, instance, **kwargs):
+    # A signal instead of only save(), as loading fixtures (raw saves) skips save() but does send pre_save.
+    instance.state_code = AccountInternetNLScan.State.from_state(instance.state)
+
+
 class AccountInternetNLScanLog(models.Model):
     scan = models.ForeignKey(
         AccountInternetNLScan,
@@ -521,3 +619,10 @@ class AccountInternetNLScanLog(models.Model):
         blank=True,
         null=True
     )
+
+    class Meta:
+        # Logs are read newest first for a single scan, for example in update_state, which the index covers.
+        ordering = ['-at_when']
+        indexes = [
+            models.Index(fields=['scan', '-at_when'], name='scanlog_scan_at_when_idx'),
+        ]
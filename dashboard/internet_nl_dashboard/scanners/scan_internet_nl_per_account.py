@@ -1,14 +1,13 @@
 import logging
 from copy import copy
 from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from typing import List
 
-import pytz
 from actstream import action
 from celery import Task, chain, group
 from constance import config
 from django.db import transaction
-from django.db.models import Q
 from django.utils import timezone
 from websecmap.organizations.models import Url
 from websecmap.reporting.report import recreate_url_reports
@@ -94,7 +93,7 @@ def initialize_scan(urllist_id: UrlList, manual_or_scheduled: str = "scheduled")
     accountinternetnlscan = AccountInternetNLScan()
     accountinternetnlscan.account = urllist.account
     accountinternetnlscan.urllist = urllist
-    accountinternetnlscan.started_on = datetime.now(pytz.utc)
+    accountinternetnlscan.started_on = datetime.now(dt_timezone.utc)
     accountinternetnlscan.scan = new_scan
     accountinternetnlscan.state = ""
     accountinternetnlscan.save()
@@ -119,10 +118,8 @@ def check_running_dashboard_scans(**kwargs) -> Task:
         scans = AccountInternetNLScan.objects.all()
         scans = add_model_filter(scans, **kwargs)
     else:
-        scans = AccountInternetNLScan.objects.all().exclude(
-            Q(state="finished")
-            | Q(state__startswith="error")
-            | Q(state__startswith="cancelled"))
+        # running means: not finished, cancelled or in error.
+        scans = AccountInternetNLScan.objects.all().filter(state_code=AccountInternetNLScan.State.RUNNING)
 
     log.debug(f"Checking the state of scan {scans}.")
     tasks = [progress_running_scan(scan.id) for scan in scans]
@@ -429,7 +426,7 @@ def finishing_scan(scan_id: int):
         return
 
     # No further actions, so not setting "finishing scan" as a state, but set it to "scan finished" directly.
-    scan.finished_on = datetime.now(pytz.utc)
+    scan.finished_on = datetime.now(dt_timezone.utc)
     scan.save()
 
     update_state("finished", scan.id)
@@ -5,7 +5,7 @@ import pytz
 from django.utils import timezone
 from freezegun import freeze_time
 
-from dashboard.internet_nl_dashboard.models import UrlList
+from dashboard.internet_nl_dashboard.models import Account, AccountInternetNLScan, UrlList
 
 
 def test_determine_next_scan_moment():
@@ -71,3 +71,34 @@ def test_determine_next_scan_moment():
 
     with pytest.raises(ValueError):
         UrlList.determine_next_scan_moment("NONSENSE")
+
+
+def test_is_scan_now_available(db):
+
+    account = Account()
+    account.save()
+
+    never_scanned = UrlList(**{'name': 'never scanned', 'account': account})
+    never_scanned.save()
+
+    disabled = UrlList(**{'name': 'disabled', 'account': account, 'enable_scans': False})
+    disabled.save()
+
+    running = UrlList(**{'name': 'running', 'account': account})
+    running.save()
+
+    finished = UrlList(**{'name': 'finished', 'account': account})
+    finished.save()
+
+    # only the last scan of a list matters
+    for urllist, states in [(running, ['finished', 'requested']), (finished, ['requested', 'finished'])]:
+        for state in states:
+            AccountInternetNLScan(**{'account': account, 'urllist': urllist, 'state': state}).save()
+
+    expected = {never_scanned: True, disabled: False, running: False, finished: True}
+    for urllist, available in expected.items():
+        assert urllist.is_scan_now_available() == available
+
+        # the same outcome when the last scan is already known, for example from a prefetch
+        last_scan = AccountInternetNLScan.objects.all().filter(urllist=urllist).order_by('-id').first()
+        assert urllist.is_scan_now_available_after(last_scan) == available
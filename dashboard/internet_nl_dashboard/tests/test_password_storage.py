@@ -40,3 +40,8 @@ def test_password_storage(db) -> None:
     for account in accounts:
         # assert type(account.internet_nl_api_password) is bytes
         assert account.decrypt_password() == secret_password
+
+    # Passwords used to be stored as the string representation of bytes, these can still be decrypted.
+    account.internet_nl_api_password = str(Account.encrypt_password(secret_password).encode())
+    assert account.internet_nl_api_password.startswith("b'")
+    assert account.decrypt_password() == secret_password
@@ -45,3 +45,24 @@ def test_update_state(db):
     update_state("out of sync", my_scan.id)
     update_state("out of sync", my_scan.id)
     assert AccountInternetNLScanLog.objects.all().count() == 3
+
+    # the lifecycle is derived from the state when saving
+    assert my_scan.state_code == AccountInternetNLScan.State.RUNNING
+    update_state("finished", my_scan.id)
+    assert AccountInternetNLScan.objects.get(id=my_scan.id).state_code == AccountInternetNLScan.State.FINISHED
+    update_state("cancelled by user", my_scan.id)
+    assert AccountInternetNLScan.objects.get(id=my_scan.id).state_code == AccountInternetNLScan.State.CANCELLED
+
+
+def test_state_code_on_raw_save(db):
+    # loading fixtures saves raw, which skips AccountInternetNLScan.save()
+    account = Account()
+    account.save()
+
+    urllist = UrlList(**{'name': '', 'account': account})
+    urllist.save()
+
+    scan = AccountInternetNLScan(**{'account': account, 'urllist': urllist, 'state': 'finished'})
+    scan.save_base(raw=True)
+
+    assert AccountInternetNLScan.objects.get(id=scan.id).state_code == AccountInternetNLScan.State.FINISHED
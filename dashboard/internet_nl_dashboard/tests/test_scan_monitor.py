@@ -0,0 +1,146 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from dashboard.internet_nl_dashboard.logic import scan_monitor
+from dashboard.internet_nl_dashboard.logic.scan_monitor import get_scan_monitor_data
+from dashboard.internet_nl_dashboard.models import (Account, AccountInternetNLScan,
+                                                    AccountInternetNLScanLog, UrlList, UrlListReport)
+
+
+def test_get_scan_monitor_data(db, django_assert_num_queries):
+    # ids are reused between tests, which might result in the same cache key.
+    cache.clear()
+
+    account = Account()
+    account.save()
+
+    urllist = UrlList(**{'name': 'test list', 'account': account, 'scan_type': 'mail'})
+    urllist.save()
+
+    # A scan that has been requested, but is not yet registered at internet.nl has no scan object.
+    scan = AccountInternetNLScan()
+    scan.urllist = urllist
+    scan.account = account
+    scan.state = "requested"
+    scan.started_on = timezone.now() - timedelta(minutes=5)
+    scan.save()
+
+    for state in ["new", "requested"]:
+        scanlog = AccountInternetNLScanLog()
+        scanlog.scan = scan
+        scanlog.at_when = timezone.now()
+        scanlog.state = state
+        scanlog.save()
+
+    data = get_scan_monitor_data(account)
+
+    assert len(data) == 1
+    assert data[0]['id'] == scan.id
+    assert data[0]['type'] == "mail"
+    assert data[0]['status_url'] is None
+    assert data[0]['last_check'] is None
+    assert data[0]['last_report_id'] is None
+    # newest log first
+    assert [log['state'] for log in data[0]['log']] == ["requested", "new"]
+
+    # when nothing changed, the response comes from the cache: only the aggregate for the cache key is queried.
+    with django_assert_num_queries(1):
+        assert get_scan_monitor_data(account) == data
+
+    # a state change is visible directly, even though the response is cached.
+    scan.state = "scanning"
+    scan.state_changed_on = timezone.now()
+    scan.save()
+    assert get_scan_monitor_data(account)[0]['state'] == "scanning"
+
+    # the report is attached before the scan is finished, it is only shown when the scan has finished.
+    urllistreport = UrlListReport(**{'urllist': urllist, 'average_internet_nl_score': 42.42, 'at_when': timezone.now()})
+    urllistreport.save()
+    scan.report = urllistreport
+    scan.state = "sending mail"
+    scan.state_changed_on = timezone.now()
+    scan.save()
+    assert get_scan_monitor_data(account)[0]['last_report_id'] is None
+
+    scan.state = "finished"
+    scan.finished_on = timezone.now()
+    scan.state_changed_on = timezone.now()
+    scan.save()
+    assert get_scan_monitor_data(account)[0]['last_report_id'] == urllistreport.id
+
+    # attaching a new report without a state change, as rewrite_report_for_scan does, is also visible directly.
+    new_urllistreport = UrlListReport(**{'urllist': urllist, 'average_internet_nl_score': 4, 'at_when': timezone.now()})
+    new_urllistreport.save()
+    scan.report = new_urllistreport
+    scan.save()
+    assert get_scan_monitor_data(account)[0]['last_report_id'] == new_urllistreport.id
+
+    # deleted lists are not shown
+    urllist.is_deleted = True
+    urllist.save()
+    assert get_scan_monitor_data(account) == []
+
+
+def test_get_scan_monitor_data_fallback_reports(db):
+    cache.clear()
+
+    account = Account()
+    account.save()
+
+    finished_on = timezone.now() - timedelta(days=10)
+
+    # Scans from before the report was attached to the scan: the report is found in the day after the scan finished.
+    urllists, scans = [], []
+    for name in ['first list', 'second list']:
+        urllist = UrlList(**{'name': name, 'account': account})
+        urllist.save()
+        urllists.append(urllist)
+
+        scan = AccountInternetNLScan(**{'account': account, 'urllist': urllist, 'state': 'finished',
+                                        'started_on': finished_on - timedelta(hours=1), 'finished_on': finished_on})
+        scan.save()
+        scans.append(scan)
+
+    def add_report(urllist, at_when):
+        report = UrlListReport(**{'urllist': urllist, 'average_internet_nl_score': 42, 'at_when': at_when})
+        report.save()
+        return report
+
+    # before the window, two in the window of which the newest id wins, and one after the window with the highest id.
+    add_report(urllists[0], finished_on - timedelta(hours=1))
+    add_report(urllists[0], finished_on + timedelta(hours=1))
+    expected_first_report = add_report(urllists[0], finished_on + timedelta(hours=2))
+    # a report of the other list in the same window, with a higher id, must not be matched to the first list.
+    expected_second_report = add_report(urllists[1], finished_on + timedelta(hours=3))
+    add_report(urllists[0], finished_on + timedelta(hours=30))
+
+    data = {scan['list_id']: scan for scan in get_scan_monitor_data(account)}
+    assert data[urllists[0].id]['last_report_id'] == expected_first_report.id
+    assert data[urllists[1].id]['last_report_id'] == expected_second_report.id
+
+
+def test_get_scan_monitor_data_log_limit(db, monkeypatch):
+    cache.clear()
+    monkeypatch.setattr(scan_monitor, 'MAX_LOGS_PER_SCAN', 3)
+
+    account = Account()
+    account.save()
+
+    urllist = UrlList(**{'name': 'test list', 'account': account})
+    urllist.save()
+
+    scan = AccountInternetNLScan(**{'account': account, 'urllist': urllist, 'state': 'requested',
+                                    'started_on': timezone.now()})
+    scan.save()
+
+    # created out of order, so the newest logs are kept by at_when and not by id.
+    started = timezone.now() - timedelta(hours=1)
+    for minute in [2, 4, 0, 3, 1]:
+        AccountInternetNLScanLog(**{'scan': scan, 'state': f"state {minute}",
+                                    'at_when': started + timedelta(minutes=minute)}).save()
+
+    logs = get_scan_monitor_data(account)[0]['log']
+    assert len(logs) == 3
+    assert [log['state'] for log in logs] == ["state 4", "state 3", "state 2"]